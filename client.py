@@ -1,7 +1,13 @@
 import asyncio
+import contextlib
+import heapq
 import json
 import random
-from datetime import datetime
+import sys
+import tempfile
+import threading
+from collections.abc import AsyncIterator
+from operator import itemgetter
 from pathlib import Path
 
 import click
@@ -9,33 +15,182 @@ from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamablehttp_client
 from mcp.shared.metadata_utils import get_display_name
+from mcp.types import ListResourcesResult, ListToolsResult
 from pydantic.networks import AnyUrl
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
 
-async def display_tools(session: ClientSession):
-    """Display available tools with descriptions"""
-    print("=== AVAILABLE TOOLS ===")
-    tools_response = await session.list_tools()
+try:
+    import uvloop
+except ImportError:  # uvloop is an optional speedup (unavailable on Windows)
+    uvloop = None
+
+# Parse server payloads with orjson when available, stdlib json otherwise
+if orjson is not None:
+    json_loads = orjson.loads
+else:
+    _JSON_DECODER = json.JSONDecoder()
+
+    def json_loads(data: str):
+        """Decode a single JSON document, stopping at the end of the value"""
+        return _JSON_DECODER.raw_decode(data)[0]
+
+
+# Upper bound on tool calls in flight at once when batching independent calls
+MAX_CONCURRENT_CALLS = 8
+
+# The server script shipped next to this client, spawned for the stdio transport
+SERVER_FILE = Path(__file__).resolve().parent / "server.py"
+
+# Value pools for randomly generated demo books, drawn from a dedicated
+# generator seeded once at import
+_RNG = random.Random()
+RANDOM_TAGS = ("fiction", "science", "history", "fantasy")
+RANDOM_GENRES = ("Fiction", "Science", "History", "Fantasy")
+
+# Action menu shown before every interactive demo prompt
+DEMO_MENU = """
+Available actions:
+1. Add a random book
+2. Search books
+3. Get recommendations
+4. View statistics
+5. List all books
+6. Exit demo
+"""
+
+# Realistic books added (and removed again) by the comprehensive test
+SAMPLE_BOOKS = (
+    {
+        "title": "The Quantum Universe",
+        "author": "Brian Cox",
+        "isbn": "9780241952702",
+        "tags": ["physics", "science", "quantum mechanics"],
+        "genre": "Science",
+        "year_published": 2011,
+        "rating": 4.2,
+        "description": "An exploration of quantum mechanics and its implications for our understanding of reality",
+        "pages": 352,
+        "language": "English"
+    },
+    {
+        "title": "Sapiens: A Brief History of Humankind",
+        "author": "Yuval Noah Harari", 
+        "isbn": "9780062316097",
+        "tags": ["history", "anthropology", "evolution"],
+        "genre": "History",
+        "year_published": 2014,
+        "rating": 4.5,
+        "description": "How Homo sapiens came to dominate the world",
+        "pages": 443,
+        "language": "English"
+    },
+    {
+        "title": "Dune",
+        "author": "Frank Herbert",
+        "isbn": "9780441172719", 
+        "tags": ["science fiction", "adventure", "politics"],
+        "genre": "Science Fiction",
+        "year_published": 1965,
+        "rating": 4.8,
+        "description": "Epic tale of politics, religion, and ecology on the desert planet Arrakis",
+        "pages": 688,
+        "language": "English"
+    },
+    {
+        "title": "The Art of War",
+        "author": "Sun Tzu",
+        "isbn": "9781590302255",
+        "tags": ["strategy", "philosophy", "military"],
+        "genre": "Philosophy",
+        "year_published": -500,  # Approximate BC date
+        "rating": 4.0,
+        "description": "Ancient Chinese military treatise on strategy and tactics",
+        "pages": 273,
+        "language": "English"
+    }
+)
+
+
+async def call_tool_batch(session: ClientSession, name: str, arguments_list,
+                          limit: int = MAX_CONCURRENT_CALLS) -> list:
+    """Call one tool with several independent argument sets concurrently
+
+    Results are returned in input order; a failed call yields its exception
+    instead of cancelling the rest of the batch.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    
+    async def call(arguments: dict):
+        async with semaphore:
+            return await session.call_tool(name, arguments)
     
+    return await asyncio.gather(*(call(arguments) for arguments in arguments_list), return_exceptions=True)
+
+
+async def ainput(prompt: str = "") -> str:
+    """Read a line from stdin without blocking the event loop
+
+    The read runs on a daemon thread rather than asyncio.to_thread, so a
+    pending prompt cannot keep the process alive after Ctrl+C.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    
+    def settle(callback, value):
+        if not future.done():
+            callback(value)
+    
+    def read_line():
+        try:
+            outcome = (future.set_result, input(prompt))
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(settle, *outcome)
+        except RuntimeError:  # event loop already closed
+            pass
+    
+    threading.Thread(target=read_line, daemon=True).start()
+    return await future
+
+
+def write_lines(lines: list[str]):
+    """Write a block of output lines with a single stdout write"""
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def format_summary(summary: dict, indent: str) -> list[str]:
+    """Format a statistics summary, two decimals for averages and plain counts otherwise"""
+    return [
+        f"{indent}{key}: {value:.2f}" if isinstance(value, float) else f"{indent}{key}: {value}"
+        for key, value in summary.items()
+    ]
+
+
+def display_tools(tools_response: ListToolsResult):
+    """Display available tools with descriptions"""
+    lines = ["=== AVAILABLE TOOLS ==="]
     for i, tool in enumerate(tools_response.tools, 1):
-        display_name = get_display_name(tool)
-        print(f"{i}. {display_name}")
+        lines.append(f"{i}. {get_display_name(tool)}")
         if tool.description:
-            print(f"   📖 {tool.description}")
-        print()
+            lines.append(f"   📖 {tool.description}")
+        lines.append("")
+    write_lines(lines)
 
 
-async def display_resources(session: ClientSession):
+def display_resources(resources_response: ListResourcesResult):
     """Display available resources"""
-    print("=== AVAILABLE RESOURCES ===")
-    resources_response = await session.list_resources()
-    
+    lines = ["=== AVAILABLE RESOURCES ==="]
     for resource in resources_response.resources:
-        display_name = get_display_name(resource)
-        print(f"📚 {display_name} ({resource.uri})")
+        lines.append(f"📚 {get_display_name(resource)} ({resource.uri})")
         if resource.description:
-            print(f"   {resource.description}")
-        print()
+            lines.append(f"   {resource.description}")
+        lines.append("")
+    write_lines(lines)
 
 
 async def comprehensive_library_test(session: ClientSession):
@@ -45,24 +200,34 @@ async def comprehensive_library_test(session: ClientSession):
     print("=" * 60)
     
     try:
+        # Discovery and initial state are independent, so request them concurrently
+        tools_response, resources_response, num_books_response, stats_response = await asyncio.gather(
+            session.list_tools(),
+            session.list_resources(),
+            session.call_tool("get_num_books", {}),
+            session.call_tool("get_statistics", {"group_by": "genre"}),
+            return_exceptions=True,
+        )
+        for response in (tools_response, resources_response, num_books_response):
+            if isinstance(response, Exception):
+                raise response
+        
         # Display available tools and resources
-        await display_tools(session)
-        await display_resources(session)
+        display_tools(tools_response)
+        display_resources(resources_response)
         
         # 1. Check initial library state
         print("📊 INITIAL LIBRARY STATE")
         print("-" * 30)
         
-        num_books_response = await session.call_tool("get_num_books", {})
         initial_count = int(num_books_response.content[0].text)
         print(f"📚 Total books in library: {initial_count}")
         
         # Get initial statistics - with error handling
-        try:
-            stats_response = await session.call_tool("get_statistics", {"group_by": "genre"})
+        if isinstance(stats_response, Exception):
+            print(f"⚠️ Statistics unavailable: {stats_response}")
+        else:
             print(f"📈 Library statistics:\n{stats_response.content[0].text}")
-        except Exception as e:
-            print(f"⚠️ Statistics unavailable: {e}")
         print()
         
     except Exception as e:
@@ -73,65 +238,14 @@ async def comprehensive_library_test(session: ClientSession):
     print("➕ ADDING BOOKS")
     print("-" * 30)
     
-    sample_books = [
-        {
-            "title": "The Quantum Universe",
-            "author": "Brian Cox",
-            "isbn": "9780241952702",
-            "tags": ["physics", "science", "quantum mechanics"],
-            "genre": "Science",
-            "year_published": 2011,
-            "rating": 4.2,
-            "description": "An exploration of quantum mechanics and its implications for our understanding of reality",
-            "pages": 352,
-            "language": "English"
-        },
-        {
-            "title": "Sapiens: A Brief History of Humankind",
-            "author": "Yuval Noah Harari", 
-            "isbn": "9780062316097",
-            "tags": ["history", "anthropology", "evolution"],
-            "genre": "History",
-            "year_published": 2014,
-            "rating": 4.5,
-            "description": "How Homo sapiens came to dominate the world",
-            "pages": 443,
-            "language": "English"
-        },
-        {
-            "title": "Dune",
-            "author": "Frank Herbert",
-            "isbn": "9780441172719", 
-            "tags": ["science fiction", "adventure", "politics"],
-            "genre": "Science Fiction",
-            "year_published": 1965,
-            "rating": 4.8,
-            "description": "Epic tale of politics, religion, and ecology on the desert planet Arrakis",
-            "pages": 688,
-            "language": "English"
-        },
-        {
-            "title": "The Art of War",
-            "author": "Sun Tzu",
-            "isbn": "9781590302255",
-            "tags": ["strategy", "philosophy", "military"],
-            "genre": "Philosophy",
-            "year_published": -500,  # Approximate BC date
-            "rating": 4.0,
-            "description": "Ancient Chinese military treatise on strategy and tactics",
-            "pages": 273,
-            "language": "English"
-        }
-    ]
-    
     added_isbns = []
-    for book in sample_books:
-        try:
-            add_response = await session.call_tool("add_book", book)
+    add_responses = await call_tool_batch(session, "add_book", SAMPLE_BOOKS)
+    for book, add_response in zip(SAMPLE_BOOKS, add_responses):
+        if isinstance(add_response, Exception):
+            print(f"❌ Failed to add {book['title']}: {add_response}")
+        else:
             print(f"✅ {add_response.content[0].text}")
             added_isbns.append(book["isbn"])
-        except Exception as e:
-            print(f"❌ Failed to add {book['title']}: {e}")
     
     print()
     
@@ -146,17 +260,21 @@ async def comprehensive_library_test(session: ClientSession):
         {"query": "physics", "search_type": "tags"}
     ]
     
-    for search_test in search_tests:
+    lines = []
+    search_responses = await call_tool_batch(session, "search_books", search_tests)
+    for search_test, search_response in zip(search_tests, search_responses):
         try:
-            search_response = await session.call_tool("search_books", search_test)
-            results = json.loads(search_response.content[0].text)
-            print(f"🔎 Search '{search_test['query']}' ({search_test['search_type']}): {len(results)} results")
+            if isinstance(search_response, Exception):
+                raise search_response
+            results = json_loads(search_response.content[0].text)
+            lines.append(f"🔎 Search '{search_test['query']}' ({search_test['search_type']}): {len(results)} results")
             for result in results[:2]:  # Show first 2 results
-                print(f"   📖 {result['title']} by {result['author']}")
+                lines.append(f"   📖 {result['title']} by {result['author']}")
         except Exception as e:
-            print(f"❌ Search failed: {e}")
+            lines.append(f"❌ Search failed: {e}")
     
-    print()
+    lines.append("")
+    write_lines(lines)
     
     # 4. Test book updates
     print("✏️ TESTING BOOK UPDATES")
@@ -187,18 +305,22 @@ async def comprehensive_library_test(session: ClientSession):
         {"based_on_isbn": added_isbns[0] if added_isbns else None},
     ]
     
-    for i, rec_test in enumerate(recommendation_tests, 1):
+    lines = []
+    rec_responses = await call_tool_batch(session, "get_recommendations", recommendation_tests)
+    for i, rec_response in enumerate(rec_responses, 1):
         try:
-            rec_response = await session.call_tool("get_recommendations", rec_test)
-            recommendations = json.loads(rec_response.content[0].text)
-            print(f"🎯 Recommendation Test {i}: {len(recommendations)} books recommended")
+            if isinstance(rec_response, Exception):
+                raise rec_response
+            recommendations = json_loads(rec_response.content[0].text)
+            lines.append(f"🎯 Recommendation Test {i}: {len(recommendations)} books recommended")
             for rec in recommendations[:3]:  # Show top 3
                 rating_str = f" (⭐ {rec.get('rating', 'N/A')})" if rec.get('rating') else ""
-                print(f"   📚 {rec['title']} by {rec['author']}{rating_str}")
+                lines.append(f"   📚 {rec['title']} by {rec['author']}{rating_str}")
         except Exception as e:
-            print(f"❌ Recommendation test {i} failed: {e}")
+            lines.append(f"❌ Recommendation test {i} failed: {e}")
     
-    print()
+    lines.append("")
+    write_lines(lines)
     
     # 6. Test statistics
     print("📊 TESTING STATISTICS")
@@ -206,46 +328,53 @@ async def comprehensive_library_test(session: ClientSession):
     
     stat_types = ["genre", "author", "language", "rating"]
     
-    for stat_type in stat_types:
+    lines = []
+    stats_responses = await call_tool_batch(
+        session, "get_statistics", [{"group_by": stat_type} for stat_type in stat_types]
+    )
+    for stat_type, stats_response in zip(stat_types, stats_responses):
         try:
-            stats_response = await session.call_tool("get_statistics", {"group_by": stat_type})
-            stats = json.loads(stats_response.content[0].text)
-            print(f"📈 Statistics by {stat_type}:")
-            print(f"   Total books: {stats['total_books']}")
-            if stats['breakdown']:
-                top_items = list(stats['breakdown'].items())[:3]
-                for item, count in top_items:
-                    print(f"   - {item}: {count}")
-            if stats['summary']:
-                for key, value in stats['summary'].items():
-                    if isinstance(value, float):
-                        print(f"   {key}: {value:.2f}")
-                    else:
-                        print(f"   {key}: {value}")
-            print()
+            if isinstance(stats_response, Exception):
+                raise stats_response
+            stats = json_loads(stats_response.content[0].text)
+            lines.append(f"📈 Statistics by {stat_type}:")
+            lines.append(f"   Total books: {stats['total_books']}")
+            # The three largest groups; nlargest keeps server order among ties
+            for item, count in heapq.nlargest(3, stats['breakdown'].items(), key=itemgetter(1)):
+                lines.append(f"   - {item}: {count}")
+            lines.extend(format_summary(stats['summary'], "   "))
+            lines.append("")
         except Exception as e:
-            print(f"❌ Statistics test for {stat_type} failed: {e}")
+            lines.append(f"❌ Statistics test for {stat_type} failed: {e}")
+    
+    write_lines(lines)
     
     # 7. Test resource access
     print("📖 TESTING RESOURCE ACCESS")
     print("-" * 30)
     
+    resource_uris = ["books://all", "books://stats"]
+    if added_isbns:
+        resource_uris.append(f"books://isbn/{added_isbns[0]}")
+    
+    stats_data = None
     try:
+        # The reads are independent, so issue them concurrently
+        resource_responses = await asyncio.gather(
+            *(session.read_resource(AnyUrl(uri)) for uri in resource_uris)
+        )
+        
         # Test all books resource
-        all_books_response = await session.read_resource(AnyUrl("books://all"))
-        all_books = json.loads(all_books_response.contents[0].text)
+        all_books = json_loads(resource_responses[0].contents[0].text)
         print(f"📚 All books resource: {len(all_books)} books retrieved")
         
         # Test stats resource
-        stats_resource_response = await session.read_resource(AnyUrl("books://stats"))
-        stats_data = json.loads(stats_resource_response.contents[0].text)
+        stats_data = json_loads(resource_responses[1].contents[0].text)
         print(f"📊 Statistics resource: {stats_data['total_books']} total books")
         
         # Test individual book by ISBN
         if added_isbns:
-            isbn_resource = f"books://isbn/{added_isbns[0]}"
-            book_response = await session.read_resource(AnyUrl(isbn_resource))
-            book_data = json.loads(book_response.contents[0].text)
+            book_data = json_loads(resource_responses[2].contents[0].text)
             print(f"📖 Individual book resource: '{book_data['title']}' retrieved")
             
     except Exception as e:
@@ -257,25 +386,24 @@ async def comprehensive_library_test(session: ClientSession):
     print("📊 FINAL LIBRARY STATE")
     print("-" * 30)
     
-    final_count_response = await session.call_tool("get_num_books", {})
-    final_count = int(final_count_response.content[0].text)
+    # books://stats holds the genre statistics and nothing has changed since it
+    # was read, so only ask again if the resource read failed
+    final_stats = stats_data
+    if final_stats is None:
+        final_stats_response = await session.call_tool("get_statistics", {"group_by": "genre"})
+        final_stats = json_loads(final_stats_response.content[0].text)
+    final_count = final_stats['total_books']
     print(f"📚 Total books: {final_count} (added {final_count - initial_count} books)")
     
     # Show final comprehensive statistics
     try:
-        final_stats_response = await session.call_tool("get_statistics", {"group_by": "genre"})
-        final_stats = json.loads(final_stats_response.content[0].text)
-        print("\n📈 Final Library Overview:")
-        if final_stats['summary']:
-            for key, value in final_stats['summary'].items():
-                if isinstance(value, float):
-                    print(f"   {key}: {value:.2f}")
-                else:
-                    print(f"   {key}: {value}")
+        lines = ["\n📈 Final Library Overview:"]
+        lines.extend(format_summary(final_stats['summary'], "   "))
         
-        print("\n📚 Books by Genre:")
+        lines.append("\n📚 Books by Genre:")
         for genre, count in final_stats['breakdown'].items():
-            print(f"   {genre}: {count} books")
+            lines.append(f"   {genre}: {count} books")
+        write_lines(lines)
             
     except Exception as e:
         print(f"❌ Final stats failed: {e}")
@@ -285,53 +413,56 @@ async def comprehensive_library_test(session: ClientSession):
     print("-" * 30)
     
     removed_count = 0
-    for isbn in added_isbns:
-        try:
-            remove_response = await session.call_tool("remove_book", {"isbn": isbn})
+    remove_responses = await call_tool_batch(
+        session, "remove_book", [{"isbn": isbn} for isbn in added_isbns]
+    )
+    for isbn, remove_response in zip(added_isbns, remove_responses):
+        if isinstance(remove_response, Exception):
+            print(f"❌ Failed to remove book {isbn}: {remove_response}")
+        else:
             print(f"🗑️ {remove_response.content[0].text}")
             removed_count += 1
-        except Exception as e:
-            print(f"❌ Failed to remove book {isbn}: {e}")
     
     print(f"\n✅ Test completed! Removed {removed_count} test books.")
     
 
+def generate_random_book() -> dict:
+    """Generate a random book for the interactive demo"""
+    randint = _RNG.randint
+    randrange = _RNG.randrange
+    return {
+        "title": f"Random Book {randint(1000, 9999)}",
+        "author": f"Author {randint(100, 999)}",
+        "isbn": "978" + str(randrange(1_000_000_000, 10_000_000_000)),
+        "tags": _RNG.choices(RANDOM_TAGS, k=2),
+        "genre": _RNG.choice(RANDOM_GENRES),
+        "rating": round(_RNG.uniform(3.0, 5.0), 1),
+        "pages": randint(200, 800)
+    }
+
+
 async def interactive_demo(session: ClientSession):
     """Interactive demonstration of library features"""
     print("\n🎮 INTERACTIVE DEMO MODE")
     print("=" * 40)
     
     while True:
-        print("\nAvailable actions:")
-        print("1. Add a random book")
-        print("2. Search books")  
-        print("3. Get recommendations")
-        print("4. View statistics")
-        print("5. List all books")
-        print("6. Exit demo")
+        sys.stdout.write(DEMO_MENU)
         
         try:
-            choice = input("\nEnter your choice (1-6): ").strip()
+            choice = (await ainput("\nEnter your choice (1-6): ")).strip()
             
             if choice == "1":
                 # Add random book
-                random_book = {
-                    "title": f"Random Book {random.randint(1000, 9999)}",
-                    "author": f"Author {random.randint(100, 999)}",
-                    "isbn": f"978{random.randint(1000000000, 9999999999)}",
-                    "tags": random.choices(["fiction", "science", "history", "fantasy"], k=2),
-                    "genre": random.choice(["Fiction", "Science", "History", "Fantasy"]),
-                    "rating": round(random.uniform(3.0, 5.0), 1),
-                    "pages": random.randint(200, 800)
-                }
+                random_book = generate_random_book()
                 
                 response = await session.call_tool("add_book", random_book)
                 print(f"✅ {response.content[0].text}")
                 
             elif choice == "2":
                 # Search books
-                query = input("Enter search query: ").strip()
-                search_type = input("Search type (all/title/author/genre/tags) [all]: ").strip() or "all"
+                query = (await ainput("Enter search query: ")).strip()
+                search_type = (await ainput("Search type (all/title/author/genre/tags) [all]: ")).strip() or "all"
                 
                 response = await session.call_tool("search_books", {
                     "query": query,
@@ -339,16 +470,18 @@ async def interactive_demo(session: ClientSession):
                     "limit": 10
                 })
                 
-                results = json.loads(response.content[0].text)
-                print(f"\n🔍 Found {len(results)} results:")
+                results = json_loads(response.content[0].text)
+                lines = [f"\n🔍 Found {len(results)} results:"]
                 for i, book in enumerate(results, 1):
-                    rating_str = f" (⭐ {book.get('rating', 'N/A')})" if book.get('rating') else ""
-                    print(f"{i}. {book['title']} by {book['author']}{rating_str}")
+                    rating = book.get('rating')
+                    rating_str = f" (⭐ {rating})" if rating else ""
+                    lines.append(f"{i}. {book['title']} by {book['author']}{rating_str}")
+                write_lines(lines)
                 
             elif choice == "3":
                 # Get recommendations
-                min_rating = input("Minimum rating (1-5) [optional]: ").strip()
-                genres = input("Preferred genres (comma-separated) [optional]: ").strip()
+                min_rating = (await ainput("Minimum rating (1-5) [optional]: ")).strip()
+                genres = (await ainput("Preferred genres (comma-separated) [optional]: ")).strip()
                 
                 rec_params = {}
                 if min_rating:
@@ -357,50 +490,56 @@ async def interactive_demo(session: ClientSession):
                     rec_params["preferred_genres"] = [g.strip() for g in genres.split(",")]
                 
                 response = await session.call_tool("get_recommendations", rec_params)
-                recommendations = json.loads(response.content[0].text)
+                recommendations = json_loads(response.content[0].text)
                 
-                print(f"\n🎯 Found {len(recommendations)} recommendations:")
+                lines = [f"\n🎯 Found {len(recommendations)} recommendations:"]
                 for i, book in enumerate(recommendations, 1):
-                    rating_str = f" (⭐ {book.get('rating', 'N/A')})" if book.get('rating') else ""
-                    print(f"{i}. {book['title']} by {book['author']}{rating_str}")
+                    rating = book.get('rating')
+                    rating_str = f" (⭐ {rating})" if rating else ""
+                    lines.append(f"{i}. {book['title']} by {book['author']}{rating_str}")
+                write_lines(lines)
                 
             elif choice == "4":
                 # View statistics
-                group_by = input("Group by (genre/author/language/rating) [genre]: ").strip() or "genre"
+                group_by = (await ainput("Group by (genre/author/language/rating) [genre]: ")).strip() or "genre"
                 
                 response = await session.call_tool("get_statistics", {"group_by": group_by})
-                stats = json.loads(response.content[0].text)
+                stats = json_loads(response.content[0].text)
                 
-                print(f"\n📊 Library Statistics (by {group_by}):")
-                print(f"Total books: {stats['total_books']}")
+                lines = [
+                    f"\n📊 Library Statistics (by {group_by}):",
+                    f"Total books: {stats['total_books']}",
+                ]
                 
                 if stats['breakdown']:
-                    print(f"\nBreakdown:")
+                    lines.append("\nBreakdown:")
                     for item, count in sorted(stats['breakdown'].items()):
-                        print(f"  {item}: {count}")
+                        lines.append(f"  {item}: {count}")
                 
                 if stats['summary']:
-                    print(f"\nSummary:")
-                    for key, value in stats['summary'].items():
-                        if isinstance(value, float):
-                            print(f"  {key}: {value:.2f}")
-                        else:
-                            print(f"  {key}: {value}")
+                    lines.append("\nSummary:")
+                    lines.extend(format_summary(stats['summary'], "  "))
+                write_lines(lines)
                 
             elif choice == "5":
-                # List all books
-                count_response = await session.call_tool("get_num_books", {})
-                count = int(count_response.content[0].text)
+                # List all books from the NDJSON listing, one book per line, so
+                # the count is the line count and each book is decoded on its own
+                all_books_response = await session.read_resource(AnyUrl("books://all.ndjson"))
+                # Split on "\n" only: splitlines() would also break on U+2028 and
+                # similar characters, which JSON strings may contain unescaped
+                book_lines = all_books_response.contents[0].text.split("\n")[:-1]
+                count = len(book_lines)
                 
                 if count > 0:
-                    all_books_response = await session.read_resource(AnyUrl("books://all"))
-                    all_books = json.loads(all_books_response.contents[0].text)
-                    
-                    print(f"\n📚 All {count} books in library:")
-                    for i, book in enumerate(all_books, 1):
-                        rating_str = f" (⭐ {book.get('rating', 'N/A')})" if book.get('rating') else ""
-                        genre_str = f" [{book.get('genre', 'Unknown')}]" if book.get('genre') else ""
-                        print(f"{i}. {book['title']} by {book['author']}{genre_str}{rating_str}")
+                    lines = [f"\n📚 All {count} books in library:"]
+                    for i, book_line in enumerate(book_lines, 1):
+                        book = json_loads(book_line)
+                        rating = book.get('rating')
+                        genre = book.get('genre')
+                        rating_str = f" (⭐ {rating})" if rating else ""
+                        genre_str = f" [{genre}]" if genre else ""
+                        lines.append(f"{i}. {book['title']} by {book['author']}{genre_str}{rating_str}")
+                    write_lines(lines)
                 else:
                     print("\n📚 No books in library yet.")
                 
@@ -418,98 +557,131 @@ async def interactive_demo(session: ClientSession):
             print(f"❌ Error: {e}")
 
 
-async def test_mcp_server_stdio(port: int = 8000):
+@contextlib.asynccontextmanager
+async def stdio_session(server_file: Path, port: int = 8000,
+                        books_file: Path | None = None) -> AsyncIterator[ClientSession]:
+    """Spawn the server over stdio and yield an initialized session
+
+    The session stays open for the whole block, so several test runs can share
+    it and only pay for the initialize handshake once. Without `books_file` the
+    server uses its default books.json in the current directory.
+    """
+    args = [
+        str(server_file),
+        "--transport", "stdio",
+        "--port", str(port), 
+        "--log-level", "ERROR"
+    ]
+    if books_file is not None:
+        args += ["--books-file", str(books_file)]
+    stdio_server_params = StdioServerParameters(
+        # The running interpreter, so the spawn needs no PATH lookup
+        command=sys.executable,
+        args=args,
+    )
+
+    print(f"🔌 Starting server with command: {stdio_server_params.command} {' '.join(stdio_server_params.args)}")
+    
+    async with stdio_client(stdio_server_params) as (read, write):
+        print("📡 Server process started, creating session...")
+        
+        async with ClientSession(read, write) as session:
+            print("🤝 Initializing session...")
+            
+            # Add timeout for initialization
+            try:
+                await asyncio.wait_for(session.initialize(), timeout=10.0)
+            except asyncio.TimeoutError:
+                raise ConnectionError("Session initialization timed out") from None
+            print("✅ Session initialized successfully!")
+            
+            yield session
+
+
+@contextlib.asynccontextmanager
+async def http_session(server_url: str) -> AsyncIterator[ClientSession]:
+    """Connect over streamable HTTP and yield an initialized session"""
+    async with streamablehttp_client(server_url) as (read, write, get_session_id):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            yield session
+
+
+def root_error(error: BaseException) -> BaseException:
+    """Unwrap the exception groups raised through the SDK's task groups"""
+    while getattr(error, "exceptions", None):
+        error = error.exceptions[0]
+    return error
+
+
+async def run_session_tests(session: ClientSession, interactive: bool = True):
+    """Run the comprehensive test, then optionally the demo, on one session"""
+    await comprehensive_library_test(session)
+    
+    # Optional: Run interactive demo
+    if interactive:
+        demo_choice = (await ainput("\nRun interactive demo? (y/n): ")).strip().lower()
+        if demo_choice == 'y':
+            await interactive_demo(session)
+
+
+async def test_mcp_server_stdio(port: int = 8000, interactive: bool = True, books_file: Path | None = None):
     """Test the MCP server using stdio transport"""
     try:
         # First check if server file exists
-        server_files = ["server.py"]
-        server_file = None
-        
-        for file in server_files:
-            if Path(file).exists():
-                server_file = file
-                break
-        
-        if not server_file:
-            print("❌ Server file not found. Please ensure 'server.py' exists.")
+        if not SERVER_FILE.exists():
+            print(f"❌ Server file not found. Please ensure '{SERVER_FILE}' exists.")
             return
         
-        print(f"📂 Using server file: {server_file}")
-        
-        stdio_server_params = StdioServerParameters(
-            command="python",
-            args=[
-                server_file,
-                "--transport", "stdio",
-                "--port", str(port), 
-                "--log-level", "ERROR"
-            ],
-        )
-
-        print(f"🔌 Starting server with command: python {' '.join(stdio_server_params.args)}")
+        print(f"📂 Using server file: {SERVER_FILE}")
         
-        async with stdio_client(stdio_server_params) as (read, write):
-            print("📡 Server process started, creating session...")
+        async with stdio_session(SERVER_FILE, port, books_file) as session:
+            print("🚀 MCP Library Server Connected!")
+            print("=" * 50)
             
-            async with ClientSession(read, write) as session:
-                print("🤝 Initializing session...")
-                
-                # Add timeout for initialization
-                try:
-                    await asyncio.wait_for(session.initialize(), timeout=10.0)
-                    print("✅ Session initialized successfully!")
-                except asyncio.TimeoutError:
-                    print("❌ Session initialization timed out")
-                    return
-                except Exception as e:
-                    print(f"❌ Session initialization failed: {e}")
-                    return
-                
-                print("🚀 MCP Library Server Connected!")
-                print("=" * 50)
-                
-                try:
-                    # Run comprehensive test
-                    await comprehensive_library_test(session)
-                    
-                    # Optional: Run interactive demo
-                    demo_choice = input("\nRun interactive demo? (y/n): ").strip().lower()
-                    if demo_choice == 'y':
-                        await interactive_demo(session)
-                        
-                except Exception as e:
-                    print(f"❌ Test execution failed: {e}")
-                    import traceback
-                    traceback.print_exc()
+            try:
+                await run_session_tests(session, interactive)
+            except Exception as e:
+                print(f"❌ Test execution failed: {e}")
+                import traceback
+                traceback.print_exc()
                     
     except KeyboardInterrupt:
         print("\n👋 Test interrupted by user")
     except Exception as e:
-        print(f"❌ STDIO test setup failed: {e}")
+        print(f"❌ STDIO test setup failed: {root_error(e)}")
         import traceback
         traceback.print_exc()
 
 
-async def test_mcp_server_http(server_url: str = "http://localhost:8000/mcp"):
+async def test_mcp_server_http(server_url: str = "http://localhost:8000/mcp", interactive: bool = True):
     """Test the MCP server using HTTP transport"""
-    async with streamablehttp_client(server_url) as (read, write, get_session_id):
-        async with ClientSession(read, write) as session:
-            await session.initialize()
-            
-            print("🚀 MCP Library Server Connected via HTTP!")
-            print("=" * 50)
-            
-            # Run comprehensive test
-            await comprehensive_library_test(session)
-            
-            # Optional: Run interactive demo  
-            demo_choice = input("\nRun interactive demo? (y/n): ").strip().lower()
-            if demo_choice == 'y':
-                await interactive_demo(session)
+    async with http_session(server_url) as session:
+        print("🚀 MCP Library Server Connected via HTTP!")
+        print("=" * 50)
+        
+        await run_session_tests(session, interactive)
+
+
+async def test_all_transports(port: int = 8000, server_url: str = "http://localhost:8000/mcp"):
+    """Test the stdio and HTTP transports concurrently on one event loop"""
+    # Each transport has its own pipes/sockets and ClientSession, so the wall
+    # time is the slower of the two runs rather than their sum. Both runs add
+    # and remove the same sample books, so the spawned stdio server gets its
+    # own books file instead of sharing books.json/books.wal with the HTTP one
+    with tempfile.TemporaryDirectory() as books_dir:
+        results = await asyncio.gather(
+            test_mcp_server_stdio(port, interactive=False, books_file=Path(books_dir) / "books.json"),
+            test_mcp_server_http(server_url, interactive=False),
+            return_exceptions=True,
+        )
+    for transport, result in zip(("stdio", "http"), results):
+        if isinstance(result, Exception):
+            print(f"❌ {transport} transport test failed: {result}")
 
 
 @click.command()
-@click.option("--transport", type=click.Choice(["stdio", "http", "sse"]), default="http")
+@click.option("--transport", type=click.Choice(["stdio", "http", "sse", "all"]), default="http")
 @click.option("--server-url", default="http://localhost", help="Server URL for HTTP transport")
 @click.option("--port", default=8000, type=int, help="Server port")
 @click.option("--endpoint", default="/mcp", help="MCP endpoint path")
@@ -524,11 +696,17 @@ def test_library(transport, server_url, port, endpoint, test_only):
     print()
     
     try:
+        full_url = f"{server_url}:{port}{endpoint}"
+        # The tests are many small awaits over pipes or sockets, so prefer the
+        # libuv event loop for every transport
+        run = uvloop.run if uvloop is not None else asyncio.run
+        
         if transport == "stdio":
-            asyncio.run(test_mcp_server_stdio(port))
+            run(test_mcp_server_stdio(port, interactive=not test_only))
         elif transport in ["http", "sse"]:
-            full_url = f"{server_url}:{port}{endpoint}"
-            asyncio.run(test_mcp_server_http(full_url))
+            run(test_mcp_server_http(full_url, interactive=not test_only))
+        elif transport == "all":
+            run(test_all_transports(port, full_url))
         
         print("\n✅ All tests completed successfully!")
         
@@ -1,14 +1,19 @@
 import asyncio
+import bisect
 import contextlib
+import heapq
 import json
 import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, OrderedDict
 from collections.abc import AsyncIterator
 from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Optional, Sequence
-from dataclasses import dataclass, asdict
-import hashlib
-import re
+from typing import Optional, Sequence
 
 import click
 import uvicorn
@@ -17,48 +22,101 @@ from mcp.server.stdio import stdio_server
 from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 from mcp.types import (
     EmbeddedResource,
-    GetPromptResult,
     ImageContent,
-    Prompt,
-    PromptArgument,
-    PromptMessage,
     Resource,
-    ResourceTemplate,
     TextContent,
     Tool,
 )
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from pydantic.networks import AnyUrl
 from starlette.applications import Starlette
 from starlette.routing import Mount
 from starlette.types import Receive, Scope, Send
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # uvloop is an optional speedup (unavailable on Windows)
+    uvloop = None
+
+
+# Parse with orjson when available; both accept str or bytes
+json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def dumps_json_bytes(obj) -> bytes:
+    """Serialize obj as compact UTF-8 JSON, for the books file"""
+    if orjson is not None:
+        # NON_STR_KEYS keeps json.dumps' handling of e.g. year/None breakdown keys
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_json(obj) -> str:
+    """Serialize a tool/resource payload as compact JSON text"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_json_line(obj) -> bytes:
+    """Serialize obj as one compact UTF-8 JSON line, newline included"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def dumps_ndjson(rows) -> str:
+    """Serialize records as newline-delimited JSON, one compact object per line"""
+    if orjson is not None:
+        # Join the encoded lines and decode once, rather than once per row
+        return b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows).decode()
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
 
 # Models with validation
 class Book(BaseModel):
+    # Strip every string field (tags included) once, in pydantic-core
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
     title: str = Field(..., description="The title of the book", min_length=1)
     author: str = Field(..., description="The author of the book", min_length=1)
     isbn: str = Field(..., description="The ISBN of the book (10 or 13 digits)")
     tags: list[str] = Field(default_factory=list, description="Tags associated with the book")
     genre: Optional[str] = Field(None, description="Primary genre of the book")
-    year_published: Optional[int] = Field(None, description="Year the book was published")
+    # Years and page counts are bounded so they always fit orjson's 64-bit integers
+    year_published: Optional[int] = Field(None, description="Year the book was published", ge=-9999, le=9999)
     rating: Optional[float] = Field(None, description="Book rating (1-5 stars)", ge=1, le=5)
     description: Optional[str] = Field(None, description="Book description/summary")
-    pages: Optional[int] = Field(None, description="Number of pages", gt=0)
+    pages: Optional[int] = Field(None, description="Number of pages", gt=0, le=1_000_000)
     language: str = Field(default="English", description="Book language")
     added_date: str = Field(default_factory=lambda: datetime.now().isoformat(), description="Date added to library")
     
-    @validator('isbn')
+    @field_validator('isbn')
+    @classmethod
     def validate_isbn(cls, v):
+        # Already-clean ISBNs (the common case) need no separator stripping
+        if len(v) in (10, 13) and v.isdecimal():
+            return v
         # Remove hyphens and spaces
-        isbn_clean = re.sub(r'[-\s]', '', v)
-        if not re.match(r'^\d{10}(\d{3})?$', isbn_clean):
+        isbn_clean = ''.join(v.replace('-', '').split())
+        if len(isbn_clean) not in (10, 13) or not isbn_clean.isdecimal():
             raise ValueError('ISBN must be 10 or 13 digits')
         return isbn_clean
     
-    @validator('tags')
+    @field_validator('tags')
+    @classmethod
     def validate_tags(cls, v):
-        return [tag.strip().lower() for tag in v if tag.strip()]
+        # Tags arrive already stripped; drop the ones that were only whitespace
+        return [tag.lower() for tag in v if tag]
+
+
+class BatchAddBooksInput(BaseModel):
+    books: list[Book] = Field(..., description="Books to add in one write", min_length=1)
 
 
 class BookSearchInput(BaseModel):
@@ -68,16 +126,24 @@ class BookSearchInput(BaseModel):
 
 
 class BookUpdateInput(BaseModel):
+    # Same normalization as Book, so updated values match what a reload gives
+    model_config = ConfigDict(str_strip_whitespace=True)
+    
     isbn: str = Field(..., description="The ISBN of the book to update")
-    title: Optional[str] = None
-    author: Optional[str] = None
+    title: Optional[str] = Field(None, min_length=1)
+    author: Optional[str] = Field(None, min_length=1)
     tags: Optional[list[str]] = None
     genre: Optional[str] = None
-    year_published: Optional[int] = None
+    year_published: Optional[int] = Field(None, ge=-9999, le=9999)
     rating: Optional[float] = Field(None, ge=1, le=5)
     description: Optional[str] = None
-    pages: Optional[int] = Field(None, gt=0)
+    pages: Optional[int] = Field(None, gt=0, le=1_000_000)
     language: Optional[str] = None
+    
+    @field_validator('tags')
+    @classmethod
+    def validate_tags(cls, v):
+        return v if v is None else Book.validate_tags(v)
 
 
 class LibraryStatsInput(BaseModel):
@@ -91,26 +157,188 @@ class BookRecommendationInput(BaseModel):
     exclude_read: bool = Field(False, description="Exclude books marked as read")
 
 
+# JSON schemas advertised as tool inputs; generating one takes about a millisecond,
+# so build them once instead of on every tools/list request
+BOOK_SCHEMA = Book.model_json_schema()
+BOOK_FIELDS = frozenset(Book.model_fields)
+BATCH_ADD_BOOKS_SCHEMA = BatchAddBooksInput.model_json_schema()
+BOOK_UPDATE_SCHEMA = BookUpdateInput.model_json_schema()
+BOOK_SEARCH_SCHEMA = BookSearchInput.model_json_schema()
+LIBRARY_STATS_SCHEMA = LibraryStatsInput.model_json_schema()
+BOOK_RECOMMENDATION_SCHEMA = BookRecommendationInput.model_json_schema()
+
+# Tool and resource listings never change, so they are built once
+TOOLS = [
+    Tool(
+        name="add_book",
+        description="Add a book to the library with full metadata",
+        inputSchema=BOOK_SCHEMA,
+    ),
+    Tool(
+        name="batch_add_books",
+        description="Add several books to the library in a single write",
+        inputSchema=BATCH_ADD_BOOKS_SCHEMA,
+    ),
+    Tool(
+        name="update_book", 
+        description="Update book information by ISBN",
+        inputSchema=BOOK_UPDATE_SCHEMA,
+    ),
+    Tool(
+        name="remove_book",
+        description="Remove a book by its ISBN",
+        inputSchema={"type": "object", "properties": {"isbn": {"type": "string"}}, "required": ["isbn"]},
+    ),
+    Tool(
+        name="search_books",
+        description="Search books by title, author, genre, or tags",
+        inputSchema=BOOK_SEARCH_SCHEMA,
+    ),
+    Tool(
+        name="get_statistics",
+        description="Get library statistics grouped by various fields",
+        inputSchema=LIBRARY_STATS_SCHEMA,
+    ),
+    Tool(
+        name="get_recommendations",
+        description="Get personalized book recommendations",
+        inputSchema=BOOK_RECOMMENDATION_SCHEMA,
+    ),
+    Tool(
+        name="get_num_books",
+        description="Get the total number of books",
+        inputSchema={"type": "object", "properties": {}},
+    ),
+]
+
+RESOURCES = [
+    Resource(
+        name="all_books",
+        title="All Books", 
+        uri=AnyUrl("books://all"),
+        description="Get all books in the library with full metadata"
+    ),
+    Resource(
+        name="all_books_ndjson",
+        title="All Books (NDJSON)",
+        uri=AnyUrl("books://all.ndjson"),
+        description="All books as newline-delimited JSON, one book per line",
+        mimeType="application/x-ndjson",
+    ),
+    Resource(
+        name="library_stats",
+        title="Library Statistics",
+        uri=AnyUrl("books://stats"),
+        description="Get comprehensive library statistics"
+    ),
+]
+
+
+# books:// resource URIs: a fixed route, or isbn/<isbn> for a single book
+RESOURCE_URI = re.compile(r"books://(?:(all|all\.ndjson|stats)|isbn/([^/]+))")
+
+
+# Search types answered by scanning a column of lowercased text
+SCANNED_SEARCH_FIELDS = ("all", "title")
+# Search types answered from a term -> rows index; these fields have few
+# distinct values, so matching the distinct terms beats scanning every book
+INDEXED_SEARCH_FIELDS = ("author", "genre", "tags")
+
+
+# Mutations logged before the books file is rewritten from memory
+WAL_COMPACT_THRESHOLD = 256
+# Seconds the background compactor waits so a burst of mutations shares one rewrite
+WAL_COMPACT_DELAY = 0.02
+
+
+# Bounded query-result cache
+class ResultCache:
+    """Small LRU cache whose entries expire after `ttl` seconds (0 disables it)"""
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
 # Library Management with advanced features
 class EnhancedLibraryManagement:
-    def __init__(self, books_path: Path, backup_path: Optional[Path] = None):
+    def __init__(self, books_path: Path, backup_path: Optional[Path] = None,
+                 cache_ttl: float = 60.0):
         self.books_path = books_path
         self.backup_path = backup_path or books_path.with_suffix('.backup.json')
+        # Append-only log of mutations since the books file was last written
+        self.wal_path = books_path.with_suffix('.wal')
+        self.logger = logging.getLogger(__name__)
         
         if not books_path.exists():
             books_path.write_text("[]", encoding="utf-8")
         
         self.books = self._load_books()
-        self.logger = logging.getLogger(__name__)
+        # Row of each book by ISBN, for O(1) lookups and duplicate checks
+        self._isbn_rows: dict[str, int] = {}
+        # Lowercased search fields, aligned with self.books by row
+        self._search_columns = {field: [] for field in SCANNED_SEARCH_FIELDS}
+        self._search_postings = {field: {} for field in INDEXED_SEARCH_FIELDS}
+        # Each book's tags as a frozenset, for recommendation similarity
+        self._tag_sets: list[frozenset] = []
+        self._rebuild_indexes()
+        # Search, statistics and recommendation results, dropped whenever the library changes
+        self._query_cache = ResultCache(ttl=cache_ttl)
+        # Running per-value counts of Book fields, for statistics without a scan
+        self._group_counts: dict[str, Counter] = {}
+        # Bumped on every mutation; tags the serialized resource texts below
+        self._version = 0
+        self._rendered: dict[str, tuple[int, str]] = {}
+        
+        # Fold any mutations logged by a previous run into the books file,
+        # which also starts a fresh log
+        self._wal = open(self.wal_path, "ab", buffering=0)
+        # Serializes mutations, so compaction never races a log append
+        self._write_lock = asyncio.Lock()
+        # Background compaction, when running (see start_compaction)
+        self._compaction_due = asyncio.Event()
+        self._compaction_task: Optional[asyncio.Task] = None
+        self._wal_entries = 0
+        if self._replay_wal():
+            self.save_books()
         
     def _load_books(self) -> list:
         """Load books with error handling and validation"""
         try:
-            raw_data = json.loads(self.books_path.read_text(encoding="utf-8"))
+            raw_data = json_loads(self.books_path.read_bytes())
             # Validate and migrate old format books
             validated_books = []
             for book_data in raw_data:
                 try:
+                    # Rows this server wrote are already in canonical form
+                    if self._is_clean_book(book_data):
+                        validated_books.append(self._intern_book(book_data))
+                        continue
+
                     # Add default fields for backward compatibility
                     book_data.setdefault('genre', None)
                     book_data.setdefault('year_published', None)
@@ -120,8 +348,10 @@ class EnhancedLibraryManagement:
                     book_data.setdefault('language', 'English')
                     book_data.setdefault('added_date', datetime.now().isoformat())
                     
-                    validated_book = Book(**book_data)
-                    validated_books.append(validated_book.dict())
+                    validated_book = Book.model_validate(book_data)
+                    # A validated model's __dict__ holds exactly its field values,
+                    # so a shallow copy equals model_dump() without the serializer
+                    validated_books.append(self._intern_book(validated_book.__dict__.copy()))
                 except Exception as e:
                     self.logger.warning(f"Skipping invalid book data: {e}")
             
@@ -130,90 +360,417 @@ class EnhancedLibraryManagement:
             self.logger.error(f"Error loading books: {e}")
             return []
 
+    @staticmethod
+    def _is_clean_book(book: dict) -> bool:
+        """True if validating `book` as a Book would return exactly its values
+
+        Checks exact types and the stripping/lowercasing the validators apply,
+        which costs about a third of a full model_validate per row.
+        """
+        if book.keys() != BOOK_FIELDS:
+            return False
+        for field in ("title", "author", "language", "added_date"):
+            value = book[field]
+            if type(value) is not str or not value or value != value.strip():
+                return False
+        for field in ("genre", "description"):
+            value = book[field]
+            if value is not None and (type(value) is not str or value != value.strip()):
+                return False
+        isbn = book["isbn"]
+        if type(isbn) is not str or len(isbn) not in (10, 13) or not isbn.isdecimal():
+            return False
+        tags = book["tags"]
+        if type(tags) is not list:
+            return False
+        for tag in tags:
+            if type(tag) is not str or not tag or tag != tag.strip().lower():
+                return False
+        year, rating, pages = book["year_published"], book["rating"], book["pages"]
+        return (
+            (year is None or (type(year) is int and -9999 <= year <= 9999))
+            and (rating is None or (type(rating) is float and 1 <= rating <= 5))
+            and (pages is None or (type(pages) is int and 0 < pages <= 1_000_000))
+        )
+
+    @staticmethod
+    def _intern_book(book: dict) -> dict:
+        """Share repeated strings between books and store tags as a tuple
+
+        Authors, genres, languages and tags repeat across a library, so interning
+        keeps one copy of each; tuples are also smaller than lists. Both still
+        serialize as JSON strings and arrays.
+        """
+        for field in ("author", "genre", "language"):
+            value = book.get(field)
+            if isinstance(value, str):
+                book[field] = sys.intern(value)
+        book["isbn"] = sys.intern(book["isbn"])
+        book["tags"] = tuple(sys.intern(tag) for tag in book.get("tags") or ())
+        return book
+
+    @staticmethod
+    def _search_fields(book: dict) -> dict:
+        """Lowercased values matched by each search_type for one book"""
+        title = book.get('title', '')
+        author = book.get('author', '')
+        genre = book.get('genre')
+        tags = book.get('tags', [])
+        return {
+            "all": f"{title} {author} {genre} {' '.join(tags)}".lower(),
+            "title": title.lower(),
+            "author": (author.lower(),),
+            "genre": ((genre or '').lower(),),
+            "tags": tuple(dict.fromkeys(tag.lower() for tag in tags)),
+        }
+
+    def _rebuild_indexes(self):
+        self._isbn_rows.clear()
+        for column in self._search_columns.values():
+            column.clear()
+        self._tag_sets.clear()
+        for postings in self._search_postings.values():
+            postings.clear()
+        for row, book in enumerate(self.books):
+            self._index_book(row, book)
+
+    def _index_book(self, row: int, book: dict):
+        """Add the book at `row` to the ISBN index, search columns and postings"""
+        # setdefault keeps the first row if a hand-edited file repeats an ISBN
+        self._isbn_rows.setdefault(book["isbn"], row)
+        fields = self._search_fields(book)
+        for field, column in self._search_columns.items():
+            if row == len(column):
+                column.append(fields[field])
+            else:
+                column[row] = fields[field]
+        tag_set = frozenset(book.get('tags') or ())
+        if row == len(self._tag_sets):
+            self._tag_sets.append(tag_set)
+        else:
+            self._tag_sets[row] = tag_set
+        for field, postings in self._search_postings.items():
+            for term in fields[field]:
+                bisect.insort(postings.setdefault(term, []), row)
+
+    def _unindex_book(self, row: int, book: dict):
+        """Drop the book at `row` from the search postings"""
+        fields = self._search_fields(book)
+        for field, postings in self._search_postings.items():
+            for term in fields[field]:
+                rows = postings[term]
+                rows.remove(row)
+                if not rows:
+                    del postings[term]
+
+    def _remove_row(self, row: int):
+        """Delete the book at `row`, shifting later rows down in every index"""
+        if len(self._isbn_rows) != len(self.books):
+            # A hand-edited file repeated an ISBN; rebuilding lets the next
+            # copy take over the ISBN, as it would after a restart
+            del self.books[row]
+            self._rebuild_indexes()
+            return
+        book = self.books[row]
+        self._unindex_book(row, book)
+        del self.books[row]
+        for column in self._search_columns.values():
+            del column[row]
+        del self._tag_sets[row]
+        for postings in self._search_postings.values():
+            for rows in postings.values():
+                for i in range(bisect.bisect_right(rows, row), len(rows)):
+                    rows[i] -= 1
+        del self._isbn_rows[book["isbn"]]
+        for isbn, isbn_row in self._isbn_rows.items():
+            if isbn_row > row:
+                self._isbn_rows[isbn] = isbn_row - 1
+
+    def _apply(self, entry: dict) -> bool:
+        """Apply one logged mutation to the books and indexes
+
+        Replays are idempotent: adding a present ISBN or touching a missing one
+        is skipped, so a log that outlived its compaction is harmless.
+        """
+        op = entry["op"]
+        if op == "add":
+            book = entry["book"]
+            if book["isbn"] in self._isbn_rows:
+                return False
+            self.books.append(self._intern_book(book))
+            self._index_book(len(self.books) - 1, book)
+            self._update_group_counts(book, 1)
+        else:
+            row = self._isbn_rows.get(entry["isbn"])
+            if row is None:
+                return False
+            if op == "update":
+                book = self.books[row]
+                self._unindex_book(row, book)
+                self._update_group_counts(book, -1)
+                book.update(entry["changes"])
+                self._intern_book(book)
+                self._index_book(row, book)
+                self._update_group_counts(book, 1)
+            elif op == "remove":
+                self._update_group_counts(self.books[row], -1)
+                self._remove_row(row)
+            else:
+                raise ValueError(f"Unknown mutation '{op}'")
+        self._query_cache.clear()
+        self._version += 1
+        return True
+
+    def _replay_wal(self) -> bool:
+        """Apply mutations logged by a previous run; True if there were any"""
+        try:
+            lines = self.wal_path.read_bytes().splitlines()
+        except FileNotFoundError:
+            return False
+        
+        for line_number, line in enumerate(lines, 1):
+            try:
+                self._apply(json_loads(line))
+            except Exception as e:
+                # Only the final line can be torn by a crash mid-append
+                self.logger.warning(f"Stopping mutation log replay at line {line_number}: {e}")
+                break
+        return bool(lines)
+
+    async def _log_and_apply(self, *entries: dict):
+        """Log mutations, then apply them, compacting once enough have accumulated
+
+        Entries are encoded and written before anything changes in memory, so
+        one that cannot be logged is never applied. Callers hold
+        self._write_lock, so no entry can be appended between the snapshot and
+        the log truncation that follows it.
+        """
+        self._wal.write(b"".join(dumps_json_line(entry) for entry in entries))
+        # The change is acknowledged to the client only once it is on disk
+        await asyncio.to_thread(os.fsync, self._wal.fileno())
+        for entry in entries:
+            self._apply(entry)
+        self._wal_entries += len(entries)
+        if self._wal_entries >= WAL_COMPACT_THRESHOLD:
+            if self._compaction_task is not None:
+                self._compaction_due.set()
+            else:
+                # The mutation is already durable, so a failed snapshot must not
+                # be reported as a failed change; the next one retries
+                try:
+                    await self._compact()
+                except Exception as e:
+                    self.logger.error(f"Compaction failed: {e}")
+
+    async def _compact(self):
+        """Rewrite the books file from memory; the caller holds self._write_lock"""
+        # Serialize on the loop, where the books are consistent, and only
+        # hand the file writes to a worker thread
+        data = dumps_json_bytes(self.books)
+        await asyncio.to_thread(self._write_books, data)
+
+    async def _compaction_loop(self):
+        while True:
+            await self._compaction_due.wait()
+            self._compaction_due.clear()
+            await asyncio.sleep(WAL_COMPACT_DELAY)
+            async with self._write_lock:
+                if self._wal_entries >= WAL_COMPACT_THRESHOLD:
+                    try:
+                        await self._compact()
+                    except Exception as e:
+                        # The log still holds every change; the next trigger retries
+                        self.logger.error(f"Compaction failed: {e}")
+
+    def start_compaction(self):
+        """Compact in a background task instead of inside the mutation that fills the log"""
+        self._compaction_task = asyncio.create_task(self._compaction_loop())
+
+    async def stop_compaction(self):
+        """Stop the background compactor; close() folds in whatever is still logged"""
+        task, self._compaction_task = self._compaction_task, None
+        if task is not None:
+            # Holding the lock means the task is idle in wait()/sleep(), never
+            # mid-snapshot with a worker thread that cancel() cannot stop
+            async with self._write_lock:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    self.logger.error(f"Compaction task failed: {e}")
+
     def _backup_books(self):
         """Create backup before modifications"""
         try:
             if self.books_path.exists():
-                self.backup_path.write_text(
-                    self.books_path.read_text(encoding="utf-8"), 
-                    encoding="utf-8"
-                )
+                # Hard-link the current file as the backup: the books file is
+                # then replaced, never rewritten, so the link keeps the old
+                # contents without copying them. Copy where links are unsupported.
+                with contextlib.suppress(FileNotFoundError):
+                    self.backup_path.unlink()
+                try:
+                    os.link(self.books_path, self.backup_path)
+                except OSError:
+                    self.backup_path.write_bytes(self.books_path.read_bytes())
         except Exception as e:
             self.logger.warning(f"Backup failed: {e}")
 
     def save_books(self):
-        """Save books with backup"""
+        """Write the full library to the books file (with backup) and reset the log"""
+        self._write_books(dumps_json_bytes(self.books))
+
+    def _write_books(self, data: bytes):
+        """Replace the books file with serialized data and truncate the log"""
         self._backup_books()
         try:
-            self.books_path.write_text(
-                json.dumps(self.books, indent=2, ensure_ascii=False), 
-                encoding="utf-8"
-            )
+            # Write a sibling temp file and swap it in, so a crash mid-write
+            # never leaves a truncated books file behind
+            tmp_path = self.books_path.with_name(self.books_path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                # The log is truncated below, so the snapshot must be durable first
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.books_path)
         except Exception as e:
             self.logger.error(f"Failed to save books: {e}")
             raise
+        # Everything logged so far is in the books file now
+        self._wal.truncate(0)
+        self._wal_entries = 0
 
-    def add_book(self, book: Book) -> str:
+    def close(self):
+        """Fold the mutation log into the books file and release it"""
+        try:
+            if self._wal_entries:
+                self.save_books()
+        finally:
+            # A failed snapshot leaves the log to be replayed on the next start
+            self._wal.close()
+
+    async def add_book(self, book: Book) -> str:
         """Add book with validation"""
-        if any(b["isbn"] == book.isbn for b in self.books):
-            return f"Book with ISBN '{book.isbn}' already exists."
+        async with self._write_lock:
+            if book.isbn in self._isbn_rows:
+                return f"Book with ISBN '{book.isbn}' already exists."
 
-        book_dict = book.dict()
-        self.books.append(book_dict)
-        self.save_books()
+            entry = {"op": "add", "book": book.__dict__.copy()}
+            await self._log_and_apply(entry)
         
         self.logger.info(f"Added book: {book.title} by {book.author}")
         return f"Book '{book.title}' by {book.author} successfully added to the library."
 
-    def update_book(self, isbn: str, updates: BookUpdateInput) -> str:
-        """Update book information"""
-        book_index = None
-        for i, book in enumerate(self.books):
-            if book["isbn"] == isbn:
-                book_index = i
-                break
-        
-        if book_index is None:
-            return f"No book found with ISBN '{isbn}'."
+    async def add_books(self, books: Sequence[Book]) -> list[str]:
+        """Add several books with one log write and fsync for the whole batch"""
+        results = []
+        entries = []
+        async with self._write_lock:
+            batch_isbns = set()
+            for book in books:
+                # A batch cannot repeat an ISBN either
+                if book.isbn in self._isbn_rows or book.isbn in batch_isbns:
+                    results.append(f"Book with ISBN '{book.isbn}' already exists.")
+                    continue
+
+                batch_isbns.add(book.isbn)
+                entries.append({"op": "add", "book": book.__dict__.copy()})
+                results.append(f"Book '{book.title}' by {book.author} successfully added to the library.")
+            if entries:
+                await self._log_and_apply(*entries)
         
-        # Apply updates
-        update_dict = updates.dict(exclude_unset=True, exclude={'isbn'})
-        for field, value in update_dict.items():
-            if value is not None:
-                self.books[book_index][field] = value
+        self.logger.info(f"Added {len(entries)} of {len(books)} books in one batch")
+        return results
+
+    async def update_book(self, isbn: str, updates: BookUpdateInput) -> str:
+        """Update book information"""
+        async with self._write_lock:
+            if isbn not in self._isbn_rows:
+                return f"No book found with ISBN '{isbn}'."
+            
+            # Apply updates
+            update_dict = updates.model_dump(exclude_unset=True, exclude={'isbn'})
+            changes = {field: value for field, value in update_dict.items() if value is not None}
+            entry = {"op": "update", "isbn": isbn, "changes": changes}
+            await self._log_and_apply(entry)
         
-        self.save_books()
         return f"Book with ISBN '{isbn}' updated successfully."
 
     def search_books(self, query: str, search_type: str = "all", limit: int = 10) -> list:
         """Advanced search functionality"""
+        cache_key = ("search", query, search_type, limit)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         query_lower = query.lower()
         results = []
         
-        for book in self.books:
-            match = False
-            
-            if search_type == "all":
-                searchable_text = f"{book.get('title', '')} {book.get('author', '')} {book.get('genre', '')} {' '.join(book.get('tags', []))}"
-                match = query_lower in searchable_text.lower()
-            elif search_type == "title":
-                match = query_lower in book.get('title', '').lower()
-            elif search_type == "author":
-                match = query_lower in book.get('author', '').lower()
-            elif search_type == "genre":
-                match = query_lower in book.get('genre', '').lower()
-            elif search_type == "tags":
-                match = any(query_lower in tag.lower() for tag in book.get('tags', []))
-            
-            if match:
+        postings = self._search_postings.get(search_type)
+        if postings is not None:
+            # Match the query against each distinct term, then return the
+            # matching books in library order
+            rows = set()
+            for term, term_rows in postings.items():
+                if query_lower in term:
+                    rows.update(term_rows)
+            results = [self.books[row] for row in heapq.nsmallest(limit, rows)]
+            self._query_cache.put(cache_key, results)
+            return results
+        
+        column = self._search_columns.get(search_type)
+        if column is None:
+            return results
+        
+        # Scan only the precomputed column for this search type
+        for book, text in zip(self.books, column):
+            if query_lower in text:
                 results.append(book)
                 if len(results) >= limit:
                     break
         
+        self._query_cache.put(cache_key, results)
         return results
 
+    @staticmethod
+    def _count_groups(field: str, books, counter: Optional[Counter] = None, delta: int = 1) -> Counter:
+        """Add `delta` to the count of each book's value (each tag, for lists) of `field`"""
+        counter = Counter() if counter is None else counter
+        for book in books:
+            key = book.get(field, "Unknown")
+            if isinstance(key, (list, tuple)):  # For tags
+                for item in key:
+                    counter[item] += delta
+            else:
+                counter[key] += delta
+        return counter
+
+    def _group_counter(self, field: str) -> Counter:
+        """Per-value counts for a Book field, built on first use and then kept current"""
+        counter = self._group_counts.get(field)
+        if counter is None:
+            counter = self._group_counts[field] = self._count_groups(field, self.books)
+        return counter
+
+    def _update_group_counts(self, book: dict, delta: int):
+        for field, counter in self._group_counts.items():
+            self._count_groups(field, (book,), counter, delta)
+            if delta < 0:
+                # Drop this book's values that no book has any more, as a
+                # fresh count would
+                key = book.get(field, "Unknown")
+                for item in key if isinstance(key, (list, tuple)) else (key,):
+                    if counter.get(item, 0) <= 0:
+                        counter.pop(item, None)
+
     def get_library_statistics(self, group_by: str = "genre") -> dict:
         """Generate library statistics"""
+        cache_key = ("statistics", group_by)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         stats = {
             "total_books": len(self.books),
             "breakdown": {},
@@ -224,25 +781,25 @@ class EnhancedLibraryManagement:
             return stats
         
         # Group by specified field
-        for book in self.books:
-            key = book.get(group_by, "Unknown")
-            if isinstance(key, list):  # For tags
-                for item in key:
-                    stats["breakdown"][item] = stats["breakdown"].get(item, 0) + 1
-            else:
-                stats["breakdown"][key] = stats["breakdown"].get(key, 0) + 1
+        if group_by in Book.model_fields:
+            stats["breakdown"] = dict(self._group_counter(group_by))
+        else:
+            stats["breakdown"] = dict(self._count_groups(group_by, self.books))
         
-        # Additional summary statistics
-        ratings = [book.get('rating') for book in self.books if book.get('rating')]
+        # Additional summary statistics, from the distinct-value counts
+        ratings = [(rating, count) for rating, count in self._group_counter('rating').items() if rating]
         if ratings:
-            stats["summary"]["average_rating"] = sum(ratings) / len(ratings)
-            stats["summary"]["total_rated_books"] = len(ratings)
+            rated_books = sum(count for _, count in ratings)
+            stats["summary"]["average_rating"] = sum(rating * count for rating, count in ratings) / rated_books
+            stats["summary"]["total_rated_books"] = rated_books
         
-        pages = [book.get('pages') for book in self.books if book.get('pages')]
+        pages = [(page_count, count) for page_count, count in self._group_counter('pages').items() if page_count]
         if pages:
-            stats["summary"]["total_pages"] = sum(pages)
-            stats["summary"]["average_pages"] = sum(pages) / len(pages)
+            paged_books = sum(count for _, count in pages)
+            stats["summary"]["total_pages"] = sum(page_count * count for page_count, count in pages)
+            stats["summary"]["average_pages"] = stats["summary"]["total_pages"] / paged_books
         
+        self._query_cache.put(cache_key, stats)
         return stats
 
     def get_recommendations(self, based_on_isbn: Optional[str] = None, 
@@ -250,25 +807,38 @@ class EnhancedLibraryManagement:
                           min_rating: Optional[float] = None,
                           limit: int = 5) -> list:
         """Get book recommendations based on preferences"""
+        cache_key = (
+            "recommendations",
+            based_on_isbn,
+            tuple(preferred_genres) if preferred_genres else None,
+            min_rating,
+            limit,
+        )
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         candidates = []
         
         # If based on a specific book, find similar books
         if based_on_isbn:
-            base_book = next((b for b in self.books if b["isbn"] == based_on_isbn), None)
-            if base_book:
-                base_tags = set(base_book.get('tags', []))
+            base_row = self._isbn_rows.get(based_on_isbn)
+            if base_row is not None:
+                base_book = self.books[base_row]
+                base_tags = self._tag_sets[base_row]
+                base_tag_count = len(base_tags)
                 base_genre = base_book.get('genre')
                 
-                for book in self.books:
+                for book, book_tags in zip(self.books, self._tag_sets):
                     if book["isbn"] == based_on_isbn:
                         continue
                     
                     similarity_score = 0
-                    book_tags = set(book.get('tags', []))
                     
-                    # Tag similarity
+                    # Tag similarity (Jaccard); |A ∪ B| = |A| + |B| - |A ∩ B|
                     if base_tags and book_tags:
-                        similarity_score += len(base_tags.intersection(book_tags)) / len(base_tags.union(book_tags))
+                        shared = len(base_tags & book_tags)
+                        similarity_score += shared / (base_tag_count + len(book_tags) - shared)
                     
                     # Genre match
                     if base_genre and book.get('genre') == base_genre:
@@ -290,22 +860,32 @@ class EnhancedLibraryManagement:
                 if score > 0:
                     candidates.append((book, score))
         
-        # Sort by score and return top recommendations
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        return [book for book, _ in candidates[:limit]]
+        # Top recommendations by score; nlargest is stable, like the full sort it replaces
+        results = [book for book, _ in heapq.nlargest(limit, candidates, key=itemgetter(1))]
+        self._query_cache.put(cache_key, results)
+        return results
 
     # Existing methods with improvements
-    def remove_book(self, isbn: str) -> str:
-        initial_count = len(self.books)
-        self.books = [b for b in self.books if b["isbn"] != isbn.strip()]
-        
-        if len(self.books) == initial_count:
-            return f"No book found with ISBN '{isbn}'."
-        
-        self.save_books()
+    async def remove_book(self, isbn: str) -> str:
+        async with self._write_lock:
+            row = self._isbn_rows.get(isbn.strip())
+            if row is None:
+                return f"No book found with ISBN '{isbn}'."
+            
+            entry = {"op": "remove", "isbn": self.books[row]["isbn"]}
+            await self._log_and_apply(entry)
         self.logger.info(f"Removed book with ISBN: {isbn}")
         return f"Book with ISBN '{isbn}' removed from the library."
 
+    def render_cached(self, key: str, render) -> str:
+        """Return render(), reusing the last result until the library changes"""
+        cached = self._rendered.get(key)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        text = render()
+        self._rendered[key] = (self._version, text)
+        return text
+
     def get_num_books(self) -> int:
         return len(self.books)
 
@@ -318,9 +898,9 @@ class EnhancedLibraryManagement:
         return {"error": "Book not found."}
 
     def get_book_by_isbn(self, isbn: str) -> dict:
-        for book in self.books:
-            if book["isbn"] == isbn.strip():
-                return book
+        row = self._isbn_rows.get(isbn.strip())
+        if row is not None:
+            return self.books[row]
         return {"error": "Book not found."}
 
     # prompt methods
@@ -331,7 +911,7 @@ Library Overview:
 - Total books: {len(self.books)}
 - Available genres: {list(set(book.get('genre') for book in self.books if book.get('genre')))}
 
-User Preferences: {json.dumps(preferences, indent=2)}
+User Preferences: {dumps_json(preferences)}
 
 Please provide personalized book recommendations with explanations."""
 
@@ -339,7 +919,7 @@ Please provide personalized book recommendations with explanations."""
         stats = self.get_library_statistics()
         return f"""Analyze this personal library and provide insights:
 
-{json.dumps(stats, indent=2)}
+{dumps_json(stats)}
 
 Please provide:
 1. Collection strengths and gaps
@@ -353,7 +933,8 @@ Please provide:
 @click.option("--transport", default="http", type=click.Choice(["http", "stdio", "sse"]))
 @click.option("--port", default=8000, type=int, help="Port to run the HTTP server on")
 @click.option("--books-file", default="books.json", help="Path to books JSON file")
-def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
+@click.option("--cache-ttl", default=60.0, type=float, help="Seconds to cache search/statistics/recommendation results (0 disables)")
+def serve(log_level: str, transport: str, port: int, books_file: str, cache_ttl: float) -> None:
     """Start the MCP Library Management Server"""
     
     logging.basicConfig(
@@ -363,7 +944,7 @@ def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
     logger = logging.getLogger(__name__)
 
     books_path = Path(books_file)
-    library = EnhancedLibraryManagement(books_path)
+    library = EnhancedLibraryManagement(books_path, cache_ttl=cache_ttl)
 
     server = Server("enhanced-mcp-library")
 
@@ -371,43 +952,7 @@ def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
     @server.list_tools()
     async def list_tools() -> list[Tool]:
         """List all available tools for the library management system."""
-        return [
-            Tool(
-                name="add_book",
-                description="Add a book to the library with full metadata",
-                inputSchema=Book.schema(),
-            ),
-            Tool(
-                name="update_book", 
-                description="Update book information by ISBN",
-                inputSchema=BookUpdateInput.schema(),
-            ),
-            Tool(
-                name="remove_book",
-                description="Remove a book by its ISBN",
-                inputSchema={"type": "object", "properties": {"isbn": {"type": "string"}}, "required": ["isbn"]},
-            ),
-            Tool(
-                name="search_books",
-                description="Search books by title, author, genre, or tags",
-                inputSchema=BookSearchInput.schema(),
-            ),
-            Tool(
-                name="get_statistics",
-                description="Get library statistics grouped by various fields",
-                inputSchema=LibraryStatsInput.schema(),
-            ),
-            Tool(
-                name="get_recommendations",
-                description="Get personalized book recommendations",
-                inputSchema=BookRecommendationInput.schema(),
-            ),
-            Tool(
-                name="get_num_books",
-                description="Get the total number of books",
-                inputSchema={"type": "object", "properties": {}},
-            ),
-        ]
+        return TOOLS
 
     @server.call_tool()
     async def call_tool(name: str, arguments: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
@@ -415,41 +960,46 @@ def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
         try:
             match name:
                 case "add_book":
-                    book = Book(**arguments)
-                    result = library.add_book(book)
+                    book = Book.model_validate(arguments)
+                    result = await library.add_book(book)
                     return [TextContent(type="text", text=result)]
 
+                case "batch_add_books":
+                    batch_input = BatchAddBooksInput.model_validate(arguments)
+                    results = await library.add_books(batch_input.books)
+                    return [TextContent(type="text", text="\n".join(results))]
+
                 case "update_book":
-                    updates = BookUpdateInput(**arguments)
-                    result = library.update_book(updates.isbn, updates)
+                    updates = BookUpdateInput.model_validate(arguments)
+                    result = await library.update_book(updates.isbn, updates)
                     return [TextContent(type="text", text=result)]
 
                 case "remove_book":
-                    result = library.remove_book(arguments["isbn"])
+                    result = await library.remove_book(arguments["isbn"])
                     return [TextContent(type="text", text=result)]
 
                 case "search_books":
-                    search_input = BookSearchInput(**arguments)
+                    search_input = BookSearchInput.model_validate(arguments)
                     results = library.search_books(
                         search_input.query, 
                         search_input.search_type, 
                         search_input.limit
                     )
-                    return [TextContent(type="text", text=json.dumps(results, indent=2, ensure_ascii=False))]
+                    return [TextContent(type="text", text=dumps_json(results))]
 
                 case "get_statistics":
-                    stats_input = LibraryStatsInput(**arguments)
+                    stats_input = LibraryStatsInput.model_validate(arguments)
                     stats = library.get_library_statistics(stats_input.group_by)
-                    return [TextContent(type="text", text=json.dumps(stats, indent=2, ensure_ascii=False))]
+                    return [TextContent(type="text", text=dumps_json(stats))]
 
                 case "get_recommendations":
-                    rec_input = BookRecommendationInput(**arguments)
+                    rec_input = BookRecommendationInput.model_validate(arguments)
                     recommendations = library.get_recommendations(
                         rec_input.based_on_isbn,
                         rec_input.preferred_genres,
                         rec_input.min_rating
                     )
-                    return [TextContent(type="text", text=json.dumps(recommendations, indent=2, ensure_ascii=False))]
+                    return [TextContent(type="text", text=dumps_json(recommendations))]
 
                 case "get_num_books":
                     result = library.get_num_books()
@@ -465,38 +1015,26 @@ def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
     # resources and prompts remain similar but with new functionality
     @server.list_resources()
     async def list_resources() -> list[Resource]:
-        return [
-            Resource(
-                name="all_books",
-                title="All Books", 
-                uri=AnyUrl("books://all"),
-                description="Get all books in the library with full metadata"
-            ),
-            Resource(
-                name="library_stats",
-                title="Library Statistics",
-                uri=AnyUrl("books://stats"),
-                description="Get comprehensive library statistics"
-            ),
-        ]
+        return RESOURCES
 
     @server.read_resource()
     async def read_resource(uri: AnyUrl) -> str:
-        uri_str = str(uri)
-        if uri_str == "books://all":
-            books = library.get_all_books()
-            return json.dumps(books, indent=2, ensure_ascii=False)
-        elif uri_str == "books://stats":
-            stats = library.get_library_statistics()
-            return json.dumps(stats, indent=2, ensure_ascii=False)
-        elif uri_str.startswith("books://isbn/"):
-            isbn = uri_str.split("/")[-1]
+        match = RESOURCE_URI.fullmatch(str(uri))
+        if match is None:
+            raise ValueError(f"Resource '{uri}' not found.")
+        
+        route, isbn = match.groups()
+        if route == "all":
+            return library.render_cached(route, lambda: dumps_json(library.get_all_books()))
+        elif route == "all.ndjson":
+            return library.render_cached(route, lambda: dumps_ndjson(library.get_all_books()))
+        elif route == "stats":
+            return library.render_cached(route, lambda: dumps_json(library.get_library_statistics()))
+        else:
             book = library.get_book_by_isbn(isbn)
             if "error" in book:
                 raise ValueError(book["error"])
-            return json.dumps(book, indent=2, ensure_ascii=False)
-        else:
-            raise ValueError(f"Resource '{uri}' not found.")
+            return dumps_json(book)
 
     #### Start server ####
     logger.info("🚀 Launching MCP Library Server...")
@@ -505,10 +1043,19 @@ def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
         async def arun_stdio_server():
             logger.info("Starting MCP server with stdio transport...")
             options = server.create_initialization_options()
-            async with stdio_server() as (read_stream, write_stream):
-                await server.run(read_stream, write_stream, options)
+            library.start_compaction()
+            try:
+                async with stdio_server() as (read_stream, write_stream):
+                    await server.run(read_stream, write_stream, options)
+            finally:
+                await library.stop_compaction()
 
-        asyncio.run(arun_stdio_server())
+        # uvicorn already picks uvloop for the HTTP transports when installed
+        run = uvloop.run if uvloop is not None else asyncio.run
+        try:
+            run(arun_stdio_server())
+        finally:
+            library.close()
 
     elif transport in ["http", "sse"]:
         session_manager = StreamableHTTPSessionManager(
@@ -525,10 +1072,15 @@ def serve(log_level: str, transport: str, port: int, books_file: str) -> None:
         async def lifespan(app: Starlette) -> AsyncIterator[None]:
             async with session_manager.run():
                 logger.info("MCP Library Server started!")
+                library.start_compaction()
                 try:
                     yield
                 finally:
                     logger.info("Server shutting down...")
+                    try:
+                        await library.stop_compaction()
+                    finally:
+                        library.close()
 
         starlette_app = Starlette(
             routes=[Mount("/mcp", app=handle_streamable_http)],